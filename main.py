@@ -1,14 +1,27 @@
-import json
 import argparse
+import itertools
+import logging
+import logging.handlers
 import sys
+from concurrent.futures import ThreadPoolExecutor
 # Ensure src directory is in path or adjust import if needed based on execution context
-from src.fetcher import LeetCodeFetcher
+from src.fetcher import LeetCodeFetcher, MAX_WORKERS
+from src.cache import DiskCache
+from src.utils import json_dumps, save_data, save_jsonl
+
+logger = logging.getLogger(__name__)
 
 def main():
     parser = argparse.ArgumentParser(description="Fetch LeetCode data for a user.")
     parser.add_argument("--username", required=True, help="LeetCode username")
     parser.add_argument("--session", required=True, help="LEETCODE_SESSION cookie value")
     parser.add_argument("--csrf", required=True, help="csrftoken cookie value")
+    parser.add_argument("--output", help="Write output to this file instead of stdout (JSON is indented when written to a file)")
+    parser.add_argument("--format", choices=("json", "jsonl"), default="json",
+                        help="json: one document; jsonl: a profile_stats line, then one line per problem as it completes")
+    parser.add_argument("--refresh", action="store_true", help="Clear the local cache and re-fetch everything")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help=f"Number of questions fetched concurrently (default: {MAX_WORKERS})")
+    parser.add_argument("--verbose", action="store_true", help="Log per-question progress as well as phase changes")
 
     args = parser.parse_args()
 
@@ -17,37 +30,62 @@ def main():
     csrf_token = args.csrf
 
     # Use stderr for progress messages so stdout remains clean for JSON output
-    print(f"Fetching data for user: {username}", file=sys.stderr)
+    stderr_handler = logging.StreamHandler(sys.stderr)
+    stderr_handler.setFormatter(logging.Formatter("%(message)s"))
+    # Per-question DEBUG chatter is written in batches; INFO and above flush right away
+    buffered_handler = logging.handlers.MemoryHandler(capacity=1024, flushLevel=logging.INFO, target=stderr_handler)
+    logging.basicConfig(level=logging.INFO, handlers=[buffered_handler])
+    if args.verbose:
+        # Only this package's loggers go to DEBUG; urllib3's connection chatter stays hidden
+        logging.getLogger("src").setLevel(logging.DEBUG)
+    logger.info("Fetching data for user: %s", username)
 
     try:
-        fetcher = LeetCodeFetcher(username, session_cookie, csrf_token)
+        cache = DiskCache()
+        if args.refresh:
+            logger.info("Refreshing: clearing the local cache.")
+            cache.clear()
+        fetcher = LeetCodeFetcher(username, session_cookie, csrf_token, max_workers=args.workers, cache=cache)
 
         # 1. Test Connection
         fetcher.test_connection() # Will raise exception on failure
 
-        # 2. Fetch Profile Stats
-        profile_stats = fetcher.fetch_profile_stats() # Will raise exception on failure
-
-        # 3. Fetch List of Solved Questions (slugs, titles, difficulty)
-        solved_questions = fetcher.fetch_solved_questions()
+        # 2 & 3. Fetch Profile Stats and the List of Solved Questions (slugs, titles, difficulty)
+        # The two calls are independent, so they run concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            profile_future = executor.submit(fetcher.fetch_profile_stats)
+            solved_future = executor.submit(fetcher.fetch_solved_questions)
+            profile_stats = profile_future.result() # Will raise exception on failure
+            solved_questions = solved_future.result()
 
         # Check if solved_questions fetch was successful before proceeding
         if solved_questions is None: # fetch_solved_questions might return None on critical error
              raise Exception("Failed to retrieve the list of solved questions.")
 
-        # 4. Process Data (Fetch Submissions & Details for each solved question)
-        # Pass the list of solved questions and profile stats
-        data = fetcher.process_data(solved_questions, profile_stats)
-
-        # 5. Output the final data as JSON to stdout
-        # Use compact separators for potentially smaller output, but None indent for single line
-        print(json.dumps(data, indent=None, separators=(',', ':')))
+        # 4 & 5. Process Data (Fetch Submissions & Details for each solved question) and output it
+        if args.format == "jsonl":
+            # Each problem is written as soon as it is ready instead of being collected first
+            records = itertools.chain(
+                [{"profile_stats": fetcher.summarize_profile_stats(profile_stats)}],
+                fetcher.iter_problems(solved_questions)
+            )
+            count = save_jsonl(records, args.output)
+            logger.info("Wrote %s records to %s", count, args.output or "stdout")
+        elif args.output:
+            data = fetcher.process_data(solved_questions, profile_stats)
+            save_data(data, args.output)
+            logger.info("Saved data to %s", args.output)
+        else:
+            data = fetcher.process_data(solved_questions, profile_stats)
+            # Compact single-line UTF-8 bytes, written straight to the binary buffer
+            sys.stdout.buffer.write(json_dumps(data) + b"\n")
+            sys.stdout.buffer.flush()
 
-        print(f"Successfully fetched and processed data for {username}.", file=sys.stderr)
+        logger.info("Successfully fetched and processed data for %s.", username)
 
     except Exception as e:
-        # Print error message to stderr
-        print(f"Error: {str(e)}", file=sys.stderr)
+        # Log the error to stderr
+        logger.error("Error: %s", e)
         # Exit with a non-zero status code to indicate failure
         sys.exit(1)
 
@@ -0,0 +1,59 @@
+import os
+import sqlite3
+import threading
+import time
+from .utils import json_dumps, json_loads
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "leetcode_fetcher")
+
+class DiskCache:
+    """Thread-safe SQLite key/value store for data that rarely changes between runs."""
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "cache.sqlite3")
+        self._lock = threading.Lock()
+        # Worker threads share this one connection; the lock serializes access to it
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            # WAL keeps reads cheap while the workers write back fresh entries
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+            )
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if it is missing or expired."""
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            return default
+        return json_loads(value)
+
+    def __contains__(self, key):
+        """Return whether key holds an unexpired entry, without loading its value."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?)", (key, time.time())
+            ).fetchone()
+        return row is not None
+
+    def set(self, key, value, expire=None):
+        """Store a JSON-serializable value, optionally expiring after expire seconds."""
+        expires_at = time.time() + expire if expire is not None else None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json_dumps(value), expires_at)
+            )
+
+    def clear(self):
+        """Drop every cached entry."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,47 +1,174 @@
-import json
-import time
-from collections import defaultdict
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
-import sys
-from .utils import make_request, handle_rate_limit, parse_html_content
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from functools import lru_cache
+from .utils import make_request, handle_rate_limit, parse_html_content, json_loads, json_dumps, chunked, parse_retry_after, RateLimitError, TokenBucket
 from .scraper import scrape_problem_description, scrape_submission_code # Ensure scrape_submission_code is imported
 
-# --- Helper to log progress to stderr ---
-def log_stderr(message):
-    print(message, file=sys.stderr)
+# Number of questions fetched concurrently; the shared rate limiter keeps the overall pace polite
+MAX_WORKERS = 6
+
+# Shared request budget: RATE_LIMIT_REQUESTS per RATE_LIMIT_PERIOD seconds, bursting up to RATE_LIMIT_BURST
+RATE_LIMIT_REQUESTS = 120
+RATE_LIMIT_PERIOD = 60
+RATE_LIMIT_BURST = 10
+
+# Keep enough pooled keep-alive connections for every worker plus the scraper fallbacks
+POOL_CONNECTIONS = 8
+POOL_MAXSIZE = 16
+
+# Transient server errors are retried by the connection pool itself; 429s are left to the
+# rate limiter (Retry-After aware) and network errors to make_request's own retry loop
+_SERVER_ERROR_RETRY = Retry(
+    total=3, connect=0, read=0, backoff_factor=0.5,
+    status_forcelist=(500, 502, 503, 504), allowed_methods=None, raise_on_status=False
+)
+
+# Problems whose details are requested together in one aliased GraphQL query
+DETAILS_BATCH_SIZE = 20
+
+# Solved questions requested per page of the GraphQL problem list
+SOLVED_PAGE_SIZE = 100
+
+# Submissions whose code is requested together in one aliased GraphQL query
+CODE_BATCH_SIZE = 20
+
+# Parallel scrapes per question when GraphQL cannot serve a submission's code
+SCRAPE_WORKERS = 4
+
+# Problem descriptions are effectively immutable; re-fetch them monthly at most. Scraper
+# fallbacks are lower quality, so they are only kept long enough to avoid hammering the page.
+PROBLEM_CACHE_TTL = 30 * 86400
+SCRAPED_PROBLEM_CACHE_TTL = 86400
+# Bump when the cached problem details shape changes
+PROBLEM_CACHE_VERSION = 3
+
+# Static request headers; the per-user X-CSRFToken is added on top in __init__
+_BASE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Accept": "application/json, text/javascript, */*; q=0.01",
+    "Referer": "https://leetcode.com/problemset/all/", # More specific referer
+    "Connection": "keep-alive",
+    # REMOVED "Cookie": f"LEETCODE_SESSION={session_cookie}; csrftoken={csrf_token}"
+}
+# Stands in for code that neither GraphQL nor the scraper could return; such entries are retried
+_MISSING_CODE = "// Code could not be retrieved"
+# Difficulty names indexed by the REST problem list's level (1-3); index 0 is unused
+_DIFFICULTIES = (None, "Easy", "Medium", "Hard")
+
+_USER_STATUS_QUERY = """{ userStatus { isSignedIn } }"""
+
+_PROFILE_STATS_QUERY = """
+query userPublicProfile($username: String!) {
+    matchedUser(username: $username) {
+        username
+        submitStats: submitStatsGlobal {
+            acSubmissionNum {
+                difficulty
+                count
+            }
+        }
+    }
+}
+"""
+
+_QUESTION_QUERY = """
+query questionData($titleSlug: String!) {
+    question(titleSlug: $titleSlug) {
+        title
+        content
+        difficulty
+        topicTags { name }
+    }
+}
+"""
+
+_SOLVED_QUESTIONS_QUERY = """
+query problemsetQuestionList($categorySlug: String, $limit: Int, $skip: Int, $filters: QuestionListFilterInput) {
+    problemsetQuestionList: questionList(categorySlug: $categorySlug, limit: $limit, skip: $skip, filters: $filters) {
+        total: totalNum
+        questions: data {
+            title
+            titleSlug
+            difficulty
+            status
+        }
+    }
+}
+"""
+
+@lru_cache(maxsize=None)
+def _question_batch_query(size):
+    """Aliased query for size slugs: q0: question(titleSlug: $s0) { ...questionFields } ..."""
+    params = ", ".join(f"$s{i}: String!" for i in range(size))
+    fields = " ".join(f"q{i}: question(titleSlug: $s{i}) {{ ...questionFields }}" for i in range(size))
+    return (
+        f"query questionBatch({params}) {{ {fields} }} "
+        "fragment questionFields on QuestionNode { content topicTags { name } }"
+    )
+
+@lru_cache(maxsize=None)
+def _submission_code_batch_query(size):
+    """Aliased query for size submissions: s0: submissionDetails(submissionId: $id0) { code } ..."""
+    params = ", ".join(f"$id{i}: Int!" for i in range(size))
+    fields = " ".join(f"s{i}: submissionDetails(submissionId: $id{i}) {{ code }}" for i in range(size))
+    return f"query submissionCodes({params}) {{ {fields} }}"
+
+# Progress goes through logging (stderr) so stdout stays clean for JSON output; per-question
+# messages are DEBUG so they cost nothing unless --verbose is on
+logger = logging.getLogger(__name__)
 
 class LeetCodeFetcher:
-    def __init__(self, username, session_cookie, csrf_token):
-        """Initialize LeetCode fetcher with user credentials."""
+    __slots__ = (
+        "username", "max_workers", "cache", "graphql_url", "api_base_url",
+        "cookies", "base_headers", "session", "rate_limiter"
+    )
+
+    def __init__(self, username, session_cookie, csrf_token, max_workers=MAX_WORKERS, cache=None):
+        """Initialize LeetCode fetcher with user credentials, fan-out concurrency and optional DiskCache."""
         self.username = username
+        self.max_workers = max(1, max_workers)
+        self.cache = cache
         self.graphql_url = "https://leetcode.com/graphql"
         self.api_base_url = "https://leetcode.com/api"
         self.cookies = {"LEETCODE_SESSION": session_cookie, "csrftoken": csrf_token}
         # Base headers, Cookie will be handled by requests library via cookies param
-        self.base_headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Accept": "application/json, text/javascript, */*; q=0.01",
-            "Referer": "https://leetcode.com/problemset/all/", # More specific referer
-            "X-CSRFToken": csrf_token,
-            # REMOVED "Cookie": f"LEETCODE_SESSION={session_cookie}; csrftoken={csrf_token}"
-        }
-        log_stderr(f"Fetcher initialized for {username}. CSRF: {csrf_token[:5]}..., Session: {session_cookie[:5]}...")
+        self.base_headers = {**_BASE_HEADERS, "X-CSRFToken": csrf_token}
+        # One session for every call so TCP+TLS connections to leetcode.com are reused
+        self.session = requests.Session()
+        self.session.cookies.update(self.cookies)
+        self.session.headers.update(self.base_headers)
+        # Never let the worker count outgrow the pool, or extra connections get opened and discarded
+        pool_maxsize = max(POOL_MAXSIZE, self.max_workers)
+        # pool_block makes workers wait for a pooled connection instead of opening a throwaway one
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=pool_maxsize, max_retries=_SERVER_ERROR_RETRY, pool_block=True)
+        self.session.mount("https://", adapter)
+        # Shared across worker threads so concurrent fetches still respect a single request pace
+        self.rate_limiter = TokenBucket(RATE_LIMIT_REQUESTS, RATE_LIMIT_PERIOD, burst=RATE_LIMIT_BURST)
+        logger.debug("Fetcher initialized for %s. CSRF: %s..., Session: %s...", username, csrf_token[:5], session_cookie[:5])
+
+    def _post_graphql(self, payload):
+        """POST a GraphQL payload through the shared rate limiter, retrying on rate limits."""
+        # Serialize once; rate-limit retries resend the same bytes
+        body = json_dumps(payload)
+        return handle_rate_limit(
+            lambda: make_request(self.graphql_url, body, session=self.session, rate_limiter=self.rate_limiter)
+        )
 
     def test_connection(self):
         """Test GraphQL API connectivity and authentication."""
-        log_stderr("Testing GraphQL connection...")
-        query = """{ userStatus { isSignedIn } }"""
-        payload = {"query": query}
+        logger.info("Testing GraphQL connection...")
+        payload = {"query": _USER_STATUS_QUERY}
         try:
             # Use make_request for POST to GraphQL
-            response_data = handle_rate_limit(
-                lambda: make_request(self.graphql_url, payload, self.cookies, self.base_headers)
-            )
+            response_data = self._post_graphql(payload)
             if not response_data.get("data") or not response_data["data"]["userStatus"]["isSignedIn"]:
                 raise Exception("Authentication failed or user not signed in (checked via GraphQL).")
-            log_stderr("GraphQL Connection Test: User is signed in.")
+            logger.info("GraphQL Connection Test: User is signed in.")
         except Exception as e:
-            log_stderr(f"Error during connection test: {e}")
+            logger.error("Error during connection test: %s", e)
             # Check if the error suggests auth failure specifically
             if "Authentication failed" in str(e):
                  raise Exception(f"Authentication failed during connection test: {e}. Check cookies.")
@@ -49,117 +176,196 @@ class LeetCodeFetcher:
 
     def fetch_profile_stats(self):
         """Fetch user profile statistics using GraphQL."""
-        log_stderr("Fetching profile stats via GraphQL...")
-        query = """
-        query userPublicProfile($username: String!) {
-            matchedUser(username: $username) {
-                username
-                submitStats: submitStatsGlobal {
-                    acSubmissionNum {
-                        difficulty
-                        count
-                    }
-                }
-            }
-        }
-        """
-        payload = {"query": query, "variables": {"username": self.username}}
+        logger.info("Fetching profile stats via GraphQL...")
+        payload = {"query": _PROFILE_STATS_QUERY, "variables": {"username": self.username}}
         try:
-            response_data = handle_rate_limit(
-                lambda: make_request(self.graphql_url, payload, self.cookies, self.base_headers)
-            )
+            response_data = self._post_graphql(payload)
             if "errors" in response_data or not response_data.get("data") or not response_data["data"].get("matchedUser"):
                  error_msg = f"GraphQL error fetching profile stats: {response_data.get('errors', 'No data returned')}"
-                 log_stderr(error_msg)
+                 logger.error(error_msg)
                  raise Exception(error_msg)
 
             stats = response_data["data"]["matchedUser"]
-            log_stderr(f"Profile stats fetched successfully for {stats.get('username', 'user')}.")
+            logger.info("Profile stats fetched successfully for %s.", stats.get('username', 'user'))
             return stats
         except Exception as e:
-            log_stderr(f"Error in fetch_profile_stats: {e}")
+            logger.error("Error in fetch_profile_stats: %s", e)
             # Re-raise but ensure sensitive details aren't leaked if needed
             raise Exception(f"Failed to fetch profile stats: {e}")
 
 
     def fetch_solved_questions(self):
+        """Fetch all solved questions via GraphQL, falling back to the legacy REST endpoint."""
+        try:
+            return self.fetch_solved_questions_graphql()
+        except Exception as e:
+            logger.warning("GraphQL solved questions list failed (%s), falling back to REST API.", e)
+            return self.fetch_solved_questions_rest()
+
+    def fetch_solved_questions_graphql(self):
+        """Fetch solved questions with a server-side AC filter, paginating SOLVED_PAGE_SIZE at a time."""
+        logger.info("Fetching solved questions list via GraphQL...")
+        questions = []
+        seen_slugs = set()
+        skip = 0
+        while True:
+            payload = {
+                "query": _SOLVED_QUESTIONS_QUERY,
+                "variables": {"categorySlug": "algorithms", "skip": skip, "limit": SOLVED_PAGE_SIZE, "filters": {"status": "AC"}}
+            }
+            response_data = self._post_graphql(payload)
+            question_list = (response_data.get("data") or {}).get("problemsetQuestionList")
+            if "errors" in response_data or question_list is None:
+                raise Exception(f"GraphQL error fetching solved questions: {response_data.get('errors', 'No data returned')}")
+
+            total = question_list.get("total")
+            if not isinstance(total, int):
+                raise Exception("GraphQL solved questions list did not report a total")
+            page = question_list.get("questions") or []
+            if not page and skip < total:
+                # A short server-side page cap or an ignored skip would otherwise truncate or loop forever
+                raise Exception(f"GraphQL solved questions list returned an empty page at {skip}/{total}")
+            if page and page[0].get("titleSlug") in seen_slugs:
+                raise Exception(f"GraphQL solved questions list repeated a page at {skip}/{total}; skip is not honoured")
+            for question in page:
+                slug = question.get("titleSlug")
+                seen_slugs.add(slug)
+                if not slug or question.get("status") != "ac":
+                    continue
+                questions.append({
+                    "slug": slug,
+                    "title": question.get("title") or slug.replace('-', ' ').title(), # Fallback title from slug
+                    "difficulty": question.get("difficulty") or "Unknown"
+                })
+            # Advance by what actually came back, in case the server caps limit below SOLVED_PAGE_SIZE
+            skip += len(page)
+            if skip >= total:
+                break
+
+        logger.info("Fetched %s solved question slugs.", len(questions))
+        return questions
+
+    def fetch_solved_questions_rest(self):
         """Fetch all solved questions using the REST API endpoint."""
-        log_stderr("Fetching solved questions list via REST API...")
+        logger.info("Fetching solved questions list via REST API...")
         url = f"{self.api_base_url}/problems/algorithms/"
+        # The list is large and rarely changes; revalidate the last copy with a conditional GET
+        cache_key = f"algorithms:{self.username}"
+        cached = self.cache.get(cache_key) if self.cache is not None else None
+        conditional_headers = {}
+        if cached:
+            if cached.get("etag"):
+                conditional_headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                conditional_headers["If-Modified-Since"] = cached["last_modified"]
         try:
-            # Use requests.get for REST endpoint
-            response = requests.get(url, headers=self.base_headers, cookies=self.cookies, timeout=30)
-            response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-
-            data = response.json()
+            # Use the pooled session for REST endpoint
+            self.rate_limiter.acquire()
+            response = self.session.get(url, headers=conditional_headers, timeout=30)
+            self.rate_limiter.update_from_headers(response.headers)
+            if response.status_code == 304 and cached:
+                logger.info("Solved questions list not modified; reusing %s cached questions.", len(cached['questions']))
+                return cached["questions"]
+            if response.status_code >= 400:
+                response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+
+            # The payload lists every problem; decode it in one C-level pass, keep only the pairs
+            # list (not the rest of the document) and only walk 'ac' pairs
+            all_pairs = json_loads(response.content).get("stat_status_pairs", [])
             questions = []
-             # Use LeetCode's actual difficulty names from API if possible, else map
-            difficulties = {1: "Easy", 2: "Medium", 3: "Hard"}
-            for pair in data.get("stat_status_pairs", []):
-                # Filter for 'ac' (Accepted) status
-                if pair.get("status") != "ac":
-                    continue
+            solved_pairs = (pair for pair in all_pairs if pair.get("status") == "ac")
+            for pair in solved_pairs:
                 stat = pair.get("stat", {})
-                difficulty_info = pair.get("difficulty", {})
                 slug = stat.get("question__title_slug")
                 title = stat.get("question__title") # Get title directly if available
-                level = difficulty_info.get("level")
+                level = pair.get("difficulty", {}).get("level")
+                difficulty = _DIFFICULTIES[level] if isinstance(level, int) and 1 <= level <= 3 else "Unknown"
 
                 if not slug:
-                     log_stderr(f"Warning: Skipping question pair due to missing slug: {stat.get('question_id')}")
+                     logger.warning("Skipping question pair due to missing slug: %s", stat.get('question_id'))
                      continue
 
                 questions.append({
                     "slug": slug,
                     "title": title or slug.replace('-', ' ').title(), # Fallback title from slug
-                    "difficulty": difficulties.get(level, "Unknown")
+                    "difficulty": difficulty
                 })
 
-            log_stderr(f"Fetched {len(questions)} solved question slugs.")
+            logger.info("Fetched %s solved question slugs.", len(questions))
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if self.cache is not None and (etag or last_modified):
+                self.cache.set(cache_key, {"etag": etag, "last_modified": last_modified, "questions": questions})
             return questions
 
         except requests.exceptions.HTTPError as http_err:
-             log_stderr(f"HTTP error fetching solved questions: {http_err} - Status: {response.status_code}")
+             logger.error("HTTP error fetching solved questions: %s - Status: %s", http_err, response.status_code)
              if response.status_code in [401, 403]:
                  raise Exception(f"Authentication failed fetching solved questions (Status {response.status_code}). Check cookies.")
              else:
                  raise Exception(f"HTTP error fetching solved questions: {http_err}")
         except requests.exceptions.RequestException as req_err:
-            log_stderr(f"Request error fetching solved questions: {req_err}")
+            logger.error("Request error fetching solved questions: %s", req_err)
             raise Exception(f"Network error fetching solved questions: {req_err}")
         except Exception as e:
-            log_stderr(f"Error parsing solved questions data: {e}")
+            logger.error("Error parsing solved questions data: %s", e)
             raise Exception(f"Failed to parse solved questions list: {e}")
 
     def fetch_submissions_for_question(self, title_slug):
-        """Fetch submissions for a specific question using the REST API."""
+        """Fetch submissions for a specific question using the REST API.
+
+        With a cache, only submissions newer than the last run are processed and merged
+        into the persisted per-language history.
+        """
         url = f"{self.api_base_url}/submissions/{title_slug}/"
-        log_stderr(f"Attempting to fetch submissions for: {title_slug} via REST API")
+        history_key = f"submissions:{self.username}:{title_slug}"
+        history = self.cache.get(history_key) if self.cache is not None else None
+        last_seen_ts = history["latest_ts"] if history else 0
+        # What earlier runs already recorded; failures below fall back to it rather than to nothing
+        known_submissions = history["submissions"] if history else []
+        logger.debug("Attempting to fetch submissions for: %s via REST API", title_slug)
+        def request():
+            # Use simple GET request; cookies and headers come from the pooled session
+            self.rate_limiter.acquire()
+            response = self.session.get(url, timeout=45) # Increased timeout
+            self.rate_limiter.update_from_headers(response.headers)
+            if response.status_code == 429:
+                raise RateLimitError(parse_retry_after(response))
+            return response
+
         try:
-            # Use simple GET request with cookies handled by requests library
-            response = requests.get(url, headers=self.base_headers, cookies=self.cookies, timeout=45) # Increased timeout
+            response = handle_rate_limit(request)
 
             # Explicitly check for 403 before raising generic error
             if response.status_code == 403:
-                 log_stderr(f"Failed to fetch submissions for {title_slug}: Status 403 (Forbidden). Check authentication/permissions.")
-                 # Return empty list on auth failure for this specific slug
-                 return []
-            elif response.status_code == 429:
-                 log_stderr(f"Rate limited fetching submissions for {title_slug}. Consider adding delays.")
-                 # Could implement retry here or let higher level handle
-                 return []
-
-            response.raise_for_status() # Raise for other errors (4xx, 5xx)
-
-            data = response.json()
-            api_submissions = data.get("submissions_dump", [])
+                 logger.warning("Failed to fetch submissions for %s: Status 403 (Forbidden). Check authentication/permissions.", title_slug)
+                 # Keep what earlier runs recorded for this specific slug
+                 return known_submissions
+
+            if response.status_code >= 400:
+                response.raise_for_status() # Raise for other errors (4xx, 5xx)
+
+            # orjson decode; only the submissions list is kept, and the loop reads just the fields it needs
+            api_submissions = json_loads(response.content).get("submissions_dump", [])
             if not api_submissions:
-                log_stderr(f"No submissions found in API response for {title_slug}.")
-                return []
+                logger.debug("No submissions found in API response for %s.", title_slug)
+                return known_submissions
 
-            # Filter for accepted submissions and get the latest per language, fetch code if needed
-            accepted_subs_details = {}
+            # Reduce to the latest accepted submission per language: lang -> (timestamp, raw submission)
+            latest_by_lang = {}
+            newest_ts = last_seen_ts
             for sub in api_submissions:
+                try:
+                    current_ts = int(sub["timestamp"])
+                except (KeyError, ValueError, TypeError):
+                    logger.warning("Invalid timestamp '%s' for submission ID %s in %s", sub.get('timestamp'), sub.get('id'), title_slug)
+                    continue
+
+                # Submissions come newest-first; everything from here on is already in the history
+                if current_ts <= last_seen_ts:
+                    break
+                newest_ts = max(newest_ts, current_ts)
+
                 if sub.get("status_display") != "Accepted":
                     continue
 
@@ -167,108 +373,260 @@ class LeetCodeFetcher:
                 if not lang:
                     continue
 
-                try:
-                    current_ts = int(sub["timestamp"])
-                except (ValueError, TypeError):
-                    log_stderr(f"Warning: Invalid timestamp '{sub.get('timestamp')}' for submission ID {sub.get('id')} in {title_slug}")
-                    continue
+                current = latest_by_lang.get(lang)
+                if current is None or current_ts > current[0]:
+                    latest_by_lang[lang] = (current_ts, sub)
+
+            # Languages without a newer accepted submission keep their previous winner
+            kept = [prev for prev in history["submissions"] if prev["language"] not in latest_by_lang] if history else []
+            # Earlier runs that failed to get a winner's code left a placeholder; retry those too,
+            # since the timestamp cutoff means they never show up as new submissions again
+            retry_ids = [prev["submission_id"] for prev in kept if prev.get("code") == _MISSING_CODE]
+
+            # Only the winners need code; fetch whatever the dump lacks in one batched GraphQL call
+            missing_ids = [sub["id"] for _, sub in latest_by_lang.values() if not sub.get("code") and sub.get("id")]
+            missing_ids += retry_ids
+            fetched_codes = self._cached_submission_codes(missing_ids)
+            uncached_ids = [submission_id for submission_id in missing_ids if submission_id not in fetched_codes]
+            if uncached_ids:
+                fetched_codes.update(self.fetch_submission_codes(uncached_ids))
+
+            # Whatever GraphQL could not serve falls back to scraping, in parallel under the shared limiter
+            to_scrape = [submission_id for submission_id in uncached_ids if submission_id not in fetched_codes]
+            if to_scrape:
+                logger.debug("Code not available via GraphQL for %s submissions in %s, attempting scrape...", len(to_scrape), title_slug)
+                with ThreadPoolExecutor(max_workers=SCRAPE_WORKERS) as executor:
+                    scraped_codes = executor.map(
+                        lambda submission_id: scrape_submission_code(
+                            submission_id, self.cookies, session=self.session, rate_limiter=self.rate_limiter
+                        ),
+                        to_scrape
+                    )
+                    fetched_codes.update(zip(to_scrape, scraped_codes))
+            self._store_submission_codes({submission_id: fetched_codes.get(submission_id) for submission_id in uncached_ids})
+
+            submissions = []
+            for lang, (current_ts, sub) in latest_by_lang.items():
+                submission_id = sub.get("id")
+                code = sub.get("code") or fetched_codes.get(submission_id) # Sometimes the API includes it
+                if not code and submission_id:
+                    logger.warning("Failed to scrape code for submission %s", submission_id)
+                    code = _MISSING_CODE
+
+                # Store the details needed by the backend
+                submissions.append({
+                    "status": sub["status_display"],
+                    "timestamp": str(current_ts), # Output format keeps string timestamps
+                    "runtime": sub.get("runtime", "N/A"),
+                    "memory": sub.get("memory", "N/A"),
+                    "language": lang,
+                    "submission_id": str(submission_id), # Ensure string
+                    "code": code or ""
+                })
+            logger.debug("Found %s new accepted submissions for %s.", len(submissions), title_slug)
 
-                # Check if this submission is newer for the language
-                if lang not in accepted_subs_details or current_ts > int(accepted_subs_details[lang]["timestamp"]):
-                    submission_id = sub.get("id")
-                    code = sub.get("code") # Sometimes the API includes it
-                    if not code and submission_id:
-                        log_stderr(f"Code not in API dump for submission {submission_id}, attempting scrape...")
-                        # Add a small delay before scraping
-                        time.sleep(0.5)
-                        code = scrape_submission_code(submission_id, self.cookies)
-                        if not code:
-                             log_stderr(f"Warning: Failed to scrape code for submission {submission_id}")
-                             code = "// Code could not be retrieved"
-
-                    # Store the details needed by the backend
-                    accepted_subs_details[lang] = {
-                        "status": sub["status_display"],
-                        "timestamp": str(sub["timestamp"]), # Ensure string
-                        "runtime": sub.get("runtime", "N/A"),
-                        "memory": sub.get("memory", "N/A"),
-                        "language": lang,
-                        "submission_id": str(submission_id), # Ensure string
-                        "code": code or ""
-                    }
-            log_stderr(f"Found {len(accepted_subs_details)} accepted submissions for {title_slug}.")
-            return list(accepted_subs_details.values())
+            for prev in kept:
+                if prev.get("code") == _MISSING_CODE and fetched_codes.get(prev["submission_id"]):
+                    prev["code"] = fetched_codes[prev["submission_id"]]
 
+            if self.cache is not None:
+                submissions += kept
+                self.cache.set(history_key, {"latest_ts": newest_ts, "submissions": submissions})
+            return submissions
+
+        except RateLimitError:
+            logger.warning("Still rate limited fetching submissions for %s after retries.", title_slug)
+            return known_submissions
         except requests.exceptions.HTTPError as http_err:
             # Log non-403 HTTP errors specifically
-            log_stderr(f"HTTP error fetching submissions for {title_slug}: {http_err} - Status: {response.status_code}")
-            # Return empty list on error for this slug, allows processing others
-            return []
+            logger.warning("HTTP error fetching submissions for %s: %s - Status: %s", title_slug, http_err, response.status_code)
+            # Fall back to the recorded history for this slug, allows processing others
+            return known_submissions
         except requests.exceptions.RequestException as req_err:
-            log_stderr(f"Request error fetching submissions for {title_slug}: {req_err}")
-            return [] # Return empty list on network error for this slug
+            logger.warning("Request error fetching submissions for %s: %s", title_slug, req_err)
+            return known_submissions # Recorded history on network error for this slug
         except Exception as e:
             # Catch potential JSON parsing errors or others
-            log_stderr(f"Unexpected error processing submissions for {title_slug}: {e}")
-            return [] # Return empty list on unexpected error for this slug
+            logger.error("Unexpected error processing submissions for %s: %s", title_slug, e)
+            return known_submissions # Recorded history on unexpected error for this slug
+
+    def _cached_submission_codes(self, submission_ids):
+        """Return {submission_id: code} for the submissions whose code is in the disk cache."""
+        if self.cache is None:
+            return {}
+        codes = {}
+        for submission_id in submission_ids:
+            code = self.cache.get(f"code:{submission_id}")
+            if code:
+                codes[submission_id] = code
+        return codes
+
+    def _store_submission_codes(self, codes):
+        # Submitted code never changes, so entries are kept without expiry
+        if self.cache is None:
+            return
+        for submission_id, code in codes.items():
+            if code:
+                self.cache.set(f"code:{submission_id}", code)
+
+    def fetch_submission_codes(self, submission_ids):
+        """Fetch source code for submissions via aliased GraphQL submissionDetails queries.
+
+        Returns a dict of submission_id -> code; ids whose code could not be fetched are left out.
+        """
+        codes = {}
+        for batch in chunked(submission_ids, CODE_BATCH_SIZE):
+            payload = {
+                "query": _submission_code_batch_query(len(batch)),
+                "variables": {f"id{i}": int(submission_id) for i, submission_id in enumerate(batch)}
+            }
+            try:
+                response_data = self._post_graphql(payload)
+            except Exception as e:
+                logger.warning("Error fetching code for %s submissions via GraphQL: %s", len(batch), e)
+                continue
+            data = response_data.get("data") or {}
+            for i, submission_id in enumerate(batch):
+                details = data.get(f"s{i}")
+                if details and details.get("code"):
+                    codes[submission_id] = details["code"]
+        return codes
 
     def fetch_problem_details(self, slug):
         """Fetch problem details by slug using GraphQL (with scraper fallback)."""
-        log_stderr(f"Fetching details for problem: {slug} via GraphQL")
-        query = """
-        query questionData($titleSlug: String!) {
-            question(titleSlug: $titleSlug) {
-                title
-                content
-                difficulty
-                topicTags { name }
-            }
-        }
-        """
-        payload = {"query": query, "variables": {"titleSlug": slug}}
+        logger.debug("Fetching details for problem: %s via GraphQL", slug)
+        payload = {"query": _QUESTION_QUERY, "variables": {"titleSlug": slug}}
         try:
             # Use make_request for POST to GraphQL
-            response_data = handle_rate_limit(
-                lambda: make_request(self.graphql_url, payload, self.cookies, self.base_headers)
-            )
+            response_data = self._post_graphql(payload)
 
             if "errors" in response_data or not response_data.get("data") or not response_data["data"].get("question"):
-                log_stderr(f"GraphQL failed for {slug}, falling back to scraper. Errors: {response_data.get('errors')}")
-                # Fallback to scraper
-                time.sleep(0.5) # Small delay before scraping
-                scraped_data = scrape_problem_description(slug, self.cookies)
-                return {
-                    "title": scraped_data.get("title", slug),
-                    "description": scraped_data.get("description", "Could not fetch description."),
-                    "difficulty": scraped_data.get("difficulty", "Unknown"),
-                    "tags": scraped_data.get("tags", [])
-                }
-
-            question = response_data["data"]["question"]
-            description_text = parse_html_content(question.get("content", ""))
-            tags = [tag["name"] for tag in question.get("topicTags", []) if tag and "name" in tag]
-
-            log_stderr(f"Successfully fetched details for {slug} via GraphQL.")
-            return {
-                "title": question.get("title", slug),
-                "description": description_text,
-                "difficulty": question.get("difficulty", "Unknown"),
-                "tags": tags
-            }
+                logger.warning("GraphQL failed for %s, falling back to scraper. Errors: %s", slug, response_data.get('errors'))
+                return self._scrape_problem_details(slug)
+
+            logger.debug("Successfully fetched details for %s via GraphQL.", slug)
+            details = self._build_problem_details(slug, response_data["data"]["question"])
+            self._store_problem_details(slug, details)
+            return details
         except Exception as e:
-            log_stderr(f"Error during fetch_problem_details for {slug} (GraphQL/Scraper): {e}")
+            logger.error("Error during fetch_problem_details for %s (GraphQL/Scraper): %s", slug, e)
             # Critical failure for this problem, return minimal info
-            return {
-                "title": slug.replace('-', ' ').title(),
-                "description": f"Error fetching details: {e}",
-                "difficulty": "Unknown",
-                "tags": []
-            }
+            return self._error_problem_details(slug, e)
 
-    def process_data(self, solved_questions, profile_stats):
-        """Fetch submissions & details for solved questions and structure data."""
-        log_stderr("Starting data processing: Fetching submissions and details...")
-        # Process profile stats
+    def fetch_problem_details_batch(self, slugs):
+        """Fetch description and tags for several problems in one aliased GraphQL query, keyed by slug.
+
+        Title and difficulty are not requested: process_data already has them from the solved list.
+        """
+        logger.debug("Fetching details for %s problems via batched GraphQL", len(slugs))
+        # Batches are almost always DETAILS_BATCH_SIZE long, so the query text is built once and reused
+        payload = {"query": _question_batch_query(len(slugs)), "variables": {f"s{i}": slug for i, slug in enumerate(slugs)}}
+        try:
+            response_data = self._post_graphql(payload)
+        except Exception as e:
+            # Rate limits, rejected cookies and network failures would only repeat once per slug
+            logger.warning("Batched GraphQL failed (%s) for %s problems.", e, len(slugs))
+            return {slug: self._error_problem_details(slug, e) for slug in slugs}
+
+        data = response_data.get("data") if isinstance(response_data, dict) else None
+        if not data:
+            # The whole batch errored; per-slug queries isolate the problems that actually fail
+            errors = response_data.get("errors") if isinstance(response_data, dict) else None
+            logger.warning("Batched GraphQL returned no data (errors: %s), fetching %s problems individually.", errors, len(slugs))
+            return {slug: self.fetch_problem_details(slug) for slug in slugs}
+
+        details = {}
+        for i, slug in enumerate(slugs):
+            question = data.get(f"q{i}")
+            if question:
+                # A malformed node only costs its own problem, not the rest of the batch
+                try:
+                    details[slug] = self._build_problem_details(slug, question)
+                    self._store_problem_details(slug, details[slug])
+                except Exception as e:
+                    logger.warning("Error building details for %s: %s", slug, e)
+                    details[slug] = self._error_problem_details(slug, e)
+            else:
+                # Alias came back null; keep the scraper fallback per slug
+                logger.debug("GraphQL returned no data for %s, falling back to scraper.", slug)
+                try:
+                    details[slug] = self._scrape_problem_details(slug)
+                except Exception as e:
+                    logger.warning("Error scraping details for %s: %s", slug, e)
+                    details[slug] = self._error_problem_details(slug, e)
+        return details
+
+    def _build_problem_details(self, slug, question):
+        """Shape a GraphQL question node into the problem details structure.
+
+        Title and difficulty are only included when the query asked for them.
+        """
+        details = {
+            "description": parse_html_content(question.get("content") or ""),
+            "tags": [tag["name"] for tag in question.get("topicTags") or [] if tag and "name" in tag]
+        }
+        if "title" in question:
+            details["title"] = question.get("title") or slug
+        if "difficulty" in question:
+            details["difficulty"] = question.get("difficulty") or "Unknown"
+        return details
+
+    def _cached_problem_details(self, slug):
+        """Return previously fetched details for slug, or None on a cache miss."""
+        if self.cache is None:
+            return None
+        return self.cache.get(f"problem:v{PROBLEM_CACHE_VERSION}:{slug}")
+
+    def _has_cached_problem_details(self, slug):
+        """Return whether details for slug are cached, without loading them."""
+        return self.cache is not None and f"problem:v{PROBLEM_CACHE_VERSION}:{slug}" in self.cache
+
+    def _store_problem_details(self, slug, details, expire=PROBLEM_CACHE_TTL):
+        """Persist fetched details so later runs can skip the request."""
+        if self.cache is not None:
+            self.cache.set(f"problem:v{PROBLEM_CACHE_VERSION}:{slug}", details, expire=expire)
+
+    def _scrape_problem_details(self, slug):
+        """Fallback: scrape problem details from the problem page."""
+        scraped_data = scrape_problem_description(
+            slug, self.cookies, session=self.session, rate_limiter=self.rate_limiter
+        )
+        details = {
+            "title": scraped_data.get("title", slug),
+            "description": scraped_data.get("description", "Could not fetch description."),
+            "difficulty": scraped_data.get("difficulty", "Unknown"),
+            "tags": scraped_data.get("tags", [])
+        }
+        self._store_problem_details(slug, details, expire=SCRAPED_PROBLEM_CACHE_TTL)
+        return details
+
+    def _error_problem_details(self, slug, error):
+        """Minimal details for a problem whose details could not be fetched at all."""
+        return {
+            "title": slug.replace('-', ' ').title(),
+            "description": f"Error fetching details: {error}",
+            "difficulty": "Unknown",
+            "tags": []
+        }
+
+    def _process_one(self, question_info, problem_details, submissions_list):
+        """Combine one solved question with its fetched details and submissions."""
+        slug = question_info["slug"]
+        # Title/difficulty come from the solved list; details only fill them in when it lacks them
+        difficulty = question_info.get("difficulty")
+        if not difficulty or difficulty == "Unknown":
+            difficulty = problem_details.get("difficulty", "Unknown")
+        return {
+            "title": question_info.get("title") or problem_details.get("title", slug), # Use best available title
+            "slug": slug, # Ensure slug is always included
+            "difficulty": difficulty, # Best available difficulty
+            "description": problem_details.get("description", ""),
+            "tags": problem_details.get("tags", []),
+            "submissions": submissions_list # Attach the (potentially empty) list of submissions
+        }
+
+    def summarize_profile_stats(self, profile_stats):
+        """Reduce the profile stats response to solved counts per difficulty."""
         difficulty_map = {"Easy": 0, "Medium": 0, "Hard": 0}
         total_solved = 0
         if profile_stats and profile_stats.get("submitStats"):
@@ -278,55 +636,83 @@ class LeetCodeFetcher:
                  if difficulty in difficulty_map:
                      difficulty_map[difficulty] = count
                      total_solved += count
-        log_stderr(f"Profile Stats Processed: Total={total_solved}, E={difficulty_map['Easy']}, M={difficulty_map['Medium']}, H={difficulty_map['Hard']}")
-
-        problems_output = []
-        total_to_process = len(solved_questions)
-
-        # Fetch submissions and details per solved question
-        for i, question_info in enumerate(solved_questions):
-            slug = question_info["slug"]
-            log_stderr(f"Processing {i+1}/{total_to_process}: {slug}")
-
-            # 1. Fetch submissions for this specific slug
-            submissions_list = self.fetch_submissions_for_question(slug)
-            # If submissions fail (e.g., 403), submissions_list will be empty, but we still fetch details
-
-            # 2. Fetch problem details
-            problem_details = self.fetch_problem_details(slug)
-
-            # 3. Combine into the final structure
-            problems_output.append({
-                "title": problem_details.get("title", question_info.get("title", slug)), # Use best available title
-                "slug": slug, # Ensure slug is always included
-                "difficulty": problem_details.get("difficulty", question_info.get("difficulty", "Unknown")), # Best available difficulty
-                "description": problem_details.get("description", ""),
-                "tags": problem_details.get("tags", []),
-                "submissions": submissions_list # Attach the (potentially empty) list of submissions
-            })
-
-            # Add delay to avoid rate limiting (adjust as needed)
-            if i > 0 and i % 10 == 0:
-                time.sleep(1.5)
-            else:
-                time.sleep(0.7)
+        logger.info("Profile Stats Processed: Total=%s, E=%s, M=%s, H=%s", total_solved, difficulty_map['Easy'], difficulty_map['Medium'], difficulty_map['Hard'])
+        return {
+            "total_solved": total_solved,
+            "easy": difficulty_map["Easy"],
+            "medium": difficulty_map["Medium"],
+            "hard": difficulty_map["Hard"]
+        }
+
+    def iter_problems(self, solved_questions):
+        """Fetch submissions & details for solved questions, yielding each problem once it is complete.
 
-        log_stderr(f"Finished processing {len(problems_output)} problems.")
+        Problems are yielded in completion order, so callers can write them out without
+        holding the whole result set in memory.
+        """
+        questions_by_slug = {question_info["slug"]: question_info for question_info in solved_questions}
+        logger.info("Fetching submissions and details for %s questions with %s workers...", len(questions_by_slug), self.max_workers)
+
+        # Serve details from the disk cache where possible; only misses hit the network. Hits are
+        # only read back once their submissions are in, so cached details are never all held at once.
+        missing_slugs = [slug for slug in questions_by_slug if not self._has_cached_problem_details(slug)]
+        logger.info("Problem details: %s cached, %s to fetch.", len(questions_by_slug) - len(missing_slugs), len(missing_slugs))
+
+        # Problem details are fetched DETAILS_BATCH_SIZE slugs per GraphQL round-trip
+        batches = chunked(missing_slugs, DETAILS_BATCH_SIZE)
+        pending_details = set(missing_slugs)
+        # Details fetched by a batch whose submissions are still running
+        details_by_slug = {}
+        # Submissions that finished before their problem's details did
+        waiting = {}
+        done = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Queue the few detail batches first so they run alongside, not after, the per-question work
+            futures = {executor.submit(self.fetch_problem_details_batch, batch): None for batch in batches}
+            # If submissions fail (e.g., 403), the list will be empty, but we still fetch details
+            futures.update(
+                (executor.submit(self.fetch_submissions_for_question, slug), slug) for slug in questions_by_slug
+            )
+            for future in as_completed(futures):
+                slug = futures.pop(future)
+                if slug is None:
+                    batch_details = future.result()
+                    pending_details.difference_update(batch_details)
+                    for slug, details in batch_details.items():
+                        if slug in waiting:
+                            yield self._process_one(questions_by_slug[slug], details, waiting.pop(slug))
+                        else:
+                            details_by_slug[slug] = details
+                    continue
+                waiting[slug] = future.result()
+                done += 1
+                logger.debug("Processed submissions %s/%s", done, len(questions_by_slug))
+                if slug in pending_details:
+                    continue
+                details = details_by_slug.pop(slug, None)
+                if details is None:
+                    details = self._cached_problem_details(slug)
+                if details is None:
+                    # The entry expired after the up-front check; fetch it on its own
+                    details = self.fetch_problem_details(slug)
+                yield self._process_one(questions_by_slug[slug], details, waiting.pop(slug))
+
+        # A batch that came back without some slug leaves it here; emit it with whatever is known
+        for slug, submissions_list in waiting.items():
+            yield self._process_one(questions_by_slug[slug], {}, submissions_list)
+
+    def process_data(self, solved_questions, profile_stats):
+        """Fetch submissions & details for solved questions and structure data."""
+        logger.info("Starting data processing: Fetching submissions and details...")
+        summary = self.summarize_profile_stats(profile_stats)
+
+        # Keep the solved list's order in the combined document
+        order = {question_info["slug"]: i for i, question_info in enumerate(solved_questions)}
+        problems_output = sorted(self.iter_problems(solved_questions), key=lambda problem: order[problem["slug"]])
+
+        logger.info("Finished processing %s problems.", len(problems_output))
         return {
-            "profile_stats": {
-                "total_solved": total_solved,
-                "easy": difficulty_map["Easy"],
-                "medium": difficulty_map["Medium"],
-                "hard": difficulty_map["Hard"]
-            },
+            "profile_stats": summary,
             "problems": problems_output # This list now contains problems with details and their submissions
         }
-
-# Main Execution Logic (No changes needed in main.py structure itself)
-# main.py should call these methods in the correct order:
-# 1. fetcher = LeetCodeFetcher(...)
-# 2. fetcher.test_connection()
-# 3. profile_stats = fetcher.fetch_profile_stats()
-# 4. solved_questions = fetcher.fetch_solved_questions()
-# 5. data = fetcher.process_data(solved_questions, profile_stats) <--- Pass solved_questions here
-# 6. print(json.dumps(data))
\ No newline at end of file
@@ -1,16 +1,44 @@
-import requests
-from bs4 import BeautifulSoup
+import logging
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from .utils import TokenBucket, HTML_PARSER, DEFAULT_SESSION, collapse_whitespace
+# bs4 is imported inside the scrape functions: it is only needed on the fallback paths.
+# Parsers get the raw bytes so the backend does its own encoding detection.
 
-def scrape_problem_description(slug, cookies=None):
+logger = logging.getLogger(__name__)
+
+# Headers shared by every HTML scrape; callers extend a copy with page-specific fields
+_SCRAPE_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Accept": "text/html,application/xhtml+xml,application/xml"
+}
+
+# Strainers see the raw class attribute, so the editor class is matched as one word of it
+_RE_CODEMIRROR_CLASS = re.compile(r'(?:^|\s)CodeMirror-code(?:\s|$)')
+# Works for relative and absolute problem links alike
+_RE_PROBLEM_SLUG = re.compile(r'/problems/([^/?#]+)')
+
+# Field order of scraped submission rows, and the keys of the records/columns returned for them
+SUBMISSION_FIELDS = ("id", "title", "titleSlug", "statusDisplay", "runtime", "memory", "lang", "timestamp")
+
+# Pace for standalone scraping when the caller does not share its own limiter
+_DEFAULT_PAGES_PER_SECOND = 1
+# One bucket for every scrape in the process, so concurrent callers are paced together
+_SHARED_RATE_LIMITER = TokenBucket(_DEFAULT_PAGES_PER_SECOND)
+# Submission list pages requested concurrently by scrape_all_submissions
+_PAGE_WORKERS = 4
+
+def scrape_problem_description(slug, cookies=None, session=None, rate_limiter=None):
     """Scrape problem description from LeetCode problem page when GraphQL fails."""
+    http = session or DEFAULT_SESSION
     url = f"https://leetcode.com/problems/{slug}/"
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Accept": "text/html,application/xhtml+xml,application/xml"
-    }
+    rate_limiter = rate_limiter or _SHARED_RATE_LIMITER
     try:
-        response = requests.get(url, headers=headers, cookies=cookies, timeout=30)
+        rate_limiter.acquire()
+        response = http.get(url, headers=_SCRAPE_HEADERS, cookies=cookies, timeout=30)
+        rate_limiter.update_from_headers(response.headers)
         if response.status_code != 200:
             return {
                 "title": slug,
@@ -18,16 +46,16 @@ def scrape_problem_description(slug, cookies=None):
                 "difficulty": "Unknown",
                 "tags": []
             }
-        soup = BeautifulSoup(response.text, 'html.parser')
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(response.content, HTML_PARSER)
         title_elem = soup.find('title')
-        title = title_elem.text.replace(' - LeetCode', '') if title_elem else slug
+        title = title_elem.text.removesuffix(' - LeetCode') if title_elem else slug
         problem_container = soup.select_one('div[data-cy="question-title"]')
         if problem_container:
             parent = problem_container.parent
             description_container = parent.find_next('div', {'class': 'content__u3I1'})
             description = description_container.get_text() if description_container else ""
-            description = re.sub(r'\n\s*\n', '\n\n', description)
-            description = re.sub(r' +', ' ', description)
+            description = collapse_whitespace(description)
         else:
             description_elem = soup.select_one('div.question-content')
             description = description_elem.get_text() if description_elem else ""
@@ -42,7 +70,7 @@ def scrape_problem_description(slug, cookies=None):
             "tags": tags
         }
     except Exception as e:
-        print(f"Error scraping problem {slug}: {str(e)}")
+        logger.warning("Error scraping problem %s: %s", slug, e)
         return {
             "title": slug,
             "description": "",
@@ -50,82 +78,141 @@ def scrape_problem_description(slug, cookies=None):
             "tags": []
         }
 
-def scrape_submission_code(submission_id, cookies=None):
+def scrape_submission_code(submission_id, cookies=None, session=None, rate_limiter=None):
     """Scrape submission code from LeetCode submission detail page."""
+    http = session or DEFAULT_SESSION
     url = f"https://leetcode.com/submissions/detail/{submission_id}/"
     headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Accept": "text/html,application/xhtml+xml,application/xml",
+        **_SCRAPE_HEADERS,
         "Referer": "https://leetcode.com/submissions/",
         "X-CSRFToken": cookies.get("csrftoken") if cookies else None
     }
+    rate_limiter = rate_limiter or _SHARED_RATE_LIMITER
     try:
-        response = requests.get(url, headers=headers, cookies=cookies, timeout=30)
+        rate_limiter.acquire()
+        # Not streamed: reading the whole body lets the kept-alive connection go back to the pool
+        response = http.get(url, headers=headers, cookies=cookies, timeout=30)
+        rate_limiter.update_from_headers(response.headers)
         if response.status_code != 200:
-            print(f"Failed to fetch submission {submission_id}: Status {response.status_code}")
+            logger.warning("Failed to fetch submission %s: Status %s", submission_id, response.status_code)
             return None
-        soup = BeautifulSoup(response.text, 'html.parser')
-        code_elem = soup.select_one('div.CodeMirror-code')  # Adjust if needed
-        if code_elem:
-            code_lines = [line.get_text() for line in code_elem.find_all('div')]
-            return '\n'.join(code_lines).strip()
-        print(f"No code found for submission {submission_id}")
+        code = _extract_submission_code(response.content)
+        if code is not None:
+            return code
+        logger.warning("No code found for submission %s", submission_id)
         return None
     except Exception as e:
-        print(f"Error scraping submission {submission_id}: {str(e)}")
+        logger.warning("Error scraping submission %s: %s", submission_id, e)
         return None
 
-def scrape_all_submissions(username, cookies=None):
-    """Scrape all submission IDs from the user's submissions page."""
-    url = f"https://leetcode.com/{username}/submissions/"
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Accept": "text/html,application/xhtml+xml,application/xml",
-        "Referer": "https://leetcode.com/"
-    }
+def _extract_submission_code(content):
+    """Return the code in the page's CodeMirror block, or None if the page has none."""
+    if HTML_PARSER == "lxml":
+        from lxml import etree
+        # Compiled XPath string() gathers a row's text in C instead of joining itertext() in Python
+        row_text = etree.XPath('string()')
+        for _, elem in etree.iterparse(BytesIO(content), events=('end',), tag='div', html=True):
+            if 'CodeMirror-code' in (elem.get('class') or '').split():
+                # The block is complete at its end event; the rest of the page is never parsed
+                return '\n'.join(row_text(line) for line in elem.iterchildren('div')).strip()
+        return None
+    from bs4 import BeautifulSoup, SoupStrainer
+    # Only the editor block is built into the tree; the rest of the page is skipped while parsing
+    soup = BeautifulSoup(content, HTML_PARSER, parse_only=SoupStrainer('div', class_=_RE_CODEMIRROR_CLASS))
+    code_elem = soup.select_one('div.CodeMirror-code')  # Adjust if needed
+    if code_elem:
+        # One row div per line; walking only direct children avoids re-reading nested divs
+        return '\n'.join(line.get_text() for line in code_elem.find_all('div', recursive=False)).strip()
+    return None
+
+def _parse_submission_rows(content):
+    """Parse the rows of one submissions list page into tuples ordered as SUBMISSION_FIELDS.
+
+    Top-level and bytes-in/tuples-out so it can also run in a worker process.
+    """
+    from bs4 import BeautifulSoup, SoupStrainer
+    # Only the submission rows are built into the tree; the rest of the page is skipped while parsing
+    soup = BeautifulSoup(content, HTML_PARSER, parse_only=SoupStrainer('tr', attrs={'data-submission-id': True}))
+    submission_rows = soup.select('tr[data-submission-id]')
     submissions = []
-    page = 1
-    while True:
-        page_url = f"{url}?page={page}"
-        try:
-            response = requests.get(page_url, headers=headers, cookies=cookies, timeout=30)
-            if response.status_code != 200:
-                print(f"Failed to fetch submissions page {page}: Status {response.status_code}")
-                break
-            soup = BeautifulSoup(response.text, 'html.parser')
-            submission_rows = soup.select('tr[data-submission-id]')
-            if not submission_rows:
-                print(f"No more submissions found on page {page}")
-                break
-            for row in submission_rows:
-                sub_id = row.get('data-submission-id')
-                title_elem = row.select_one('a[href*="/problems/"]')
-                title = title_elem.text.strip() if title_elem else "Unknown"
-                slug = title_elem['href'].split('/')[2] if title_elem else "unknown"
-                status_elem = row.select_one('td:nth-child(3)')
-                status = status_elem.text.strip() if status_elem else "Unknown"
-                runtime_elem = row.select_one('td:nth-child(4)')
-                runtime = runtime_elem.text.strip() if runtime_elem else "N/A"
-                memory_elem = row.select_one('td:nth-child(5)')
-                memory = memory_elem.text.strip() if memory_elem else "N/A"
-                lang_elem = row.select_one('td:nth-child(6)')
-                lang = lang_elem.text.strip() if lang_elem else "Unknown"
-                timestamp_elem = row.select_one('td:nth-child(2) span')
-                timestamp = timestamp_elem.get('data-timestamp') if timestamp_elem else "0"
-                submissions.append({
-                    "id": sub_id,
-                    "title": title,
-                    "titleSlug": slug,
-                    "statusDisplay": status,
-                    "runtime": runtime,
-                    "memory": memory,
-                    "lang": lang,
-                    "timestamp": timestamp
-                })
-            print(f"Fetched {len(submission_rows)} submissions from page {page}")
+    for row in submission_rows:
+        sub_id = row.get('data-submission-id')
+        title_elem = row.select_one('a[href*="/problems/"]')
+        title = title_elem.text.strip() if title_elem else "Unknown"
+        slug_match = _RE_PROBLEM_SLUG.search(title_elem['href']) if title_elem else None
+        slug = slug_match.group(1) if slug_match else "unknown"
+        # Columns are read by index from one pass over the cells instead of an nth-child selector each
+        tds = row.find_all('td', recursive=False)
+        cell_count = len(tds)
+        status = tds[2].text.strip() if cell_count > 2 else "Unknown"
+        runtime = tds[3].text.strip() if cell_count > 3 else "N/A"
+        memory = tds[4].text.strip() if cell_count > 4 else "N/A"
+        lang = tds[5].text.strip() if cell_count > 5 else "Unknown"
+        timestamp_elem = tds[1].find('span') if cell_count > 1 else None
+        timestamp = timestamp_elem.get('data-timestamp') if timestamp_elem else "0"
+        submissions.append((sub_id, title, slug, status, runtime, memory, lang, timestamp))
+    return submissions
+
+def _scrape_submissions_page(page, url, headers, cookies, http, rate_limiter, parse_executor):
+    """Scrape one page of the submissions list; returns its rows, [] past the last page, or None on failure."""
+    page_url = f"{url}?page={page}"
+    try:
+        rate_limiter.acquire()
+        response = http.get(page_url, headers=headers, cookies=cookies, timeout=30)
+        rate_limiter.update_from_headers(response.headers)
+        if response.status_code != 200:
+            logger.warning("Failed to fetch submissions page %s: Status %s", page, response.status_code)
+            return None
+        if parse_executor is not None:
+            submissions = parse_executor.submit(_parse_submission_rows, response.content).result()
+        else:
+            submissions = _parse_submission_rows(response.content)
+        if submissions:
+            logger.debug("Fetched %s submissions from page %s", len(submissions), page)
+        return submissions
+    except Exception as e:
+        logger.warning("Error scraping submissions page %s: %s", page, e)
+        return None
+
+def scrape_all_submissions(username, cookies=None, session=None, rate_limiter=None, max_workers=_PAGE_WORKERS,
+                           parse_executor=None, columnar=False):
+    """Scrape all submission IDs from the user's submissions page.
+
+    Up to max_workers pages are in flight at once so their round-trips overlap; results keep page order.
+    Pass a ProcessPoolExecutor as parse_executor to parse pages outside the GIL; by default each
+    page is parsed on the thread that fetched it.
+
+    Returns a list of dicts keyed by SUBMISSION_FIELDS, or with columnar=True a dict mapping each
+    field to a list of values, which skips building a dict per submission.
+    """
+    http = session or DEFAULT_SESSION
+    rate_limiter = rate_limiter or _SHARED_RATE_LIMITER
+    url = f"https://leetcode.com/{username}/submissions/"
+    headers = {**_SCRAPE_HEADERS, "Referer": "https://leetcode.com/"}
+    rows = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def fetch(page):
+            return executor.submit(_scrape_submissions_page, page, url, headers, cookies, http, rate_limiter, parse_executor)
+        # Sliding window: each page consumed queues the next, so fetching never waits on a whole batch.
+        # The page count is not known up front; at most max_workers - 1 requests overshoot the end
+        in_flight = deque(fetch(page) for page in range(1, max_workers + 1))
+        page = 1
+        while True:
+            page_rows = in_flight.popleft().result()
+            if not page_rows:
+                if page_rows is not None:
+                    logger.debug("No more submissions found on page %s", page)
+                for future in in_flight:
+                    future.cancel()
+                return _pack_submissions(rows, columnar)
+            rows.extend(page_rows)
+            in_flight.append(fetch(page + max_workers))
             page += 1
-            time.sleep(1)  # Avoid rate limiting
-        except Exception as e:
-            print(f"Error scraping submissions page {page}: {str(e)}")
-            break
-    return submissions
\ No newline at end of file
+
+def _pack_submissions(rows, columnar):
+    """Turn row tuples into per-submission dicts, or into one list per field when columnar."""
+    if columnar:
+        columns = zip(*rows) if rows else ([] for _ in SUBMISSION_FIELDS)
+        return {field: list(column) for field, column in zip(SUBMISSION_FIELDS, columns)}
+    return [dict(zip(SUBMISSION_FIELDS, row)) for row in rows]
+
@@ -1,61 +1,248 @@
+import json
+import logging
+import os
+import random
+from importlib.util import find_spec
+import sys
+from itertools import islice
 import requests
+from requests.adapters import HTTPAdapter
+import threading
 import time
 import re
-from bs4 import BeautifulSoup
 
-def make_request(url, payload, cookies, headers, max_retries=3):
-    """Make HTTP request with retry logic."""
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib decoder
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Whitespace cleanup for parsed descriptions: blank-line runs and space runs, matched in one scan
+_RE_WHITESPACE = re.compile(r'(\n\s*\n)| {2,}')
+# The characters bs4 treats as whitespace when it collapses whitespace-only strings
+_ASCII_SPACES = ' \n\t\f\r'
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+# Statuses that mean the cookies were rejected; retrying cannot help
+_AUTH_FAILURE_STATUSES = frozenset((401, 403))
+
+# Module-wide pooled session for callers that don't pass their own, so standalone calls
+# reuse kept-alive TLS connections instead of opening one per request
+DEFAULT_SESSION = requests.Session()
+DEFAULT_SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=0))
+DEFAULT_SESSION.headers["User-Agent"] = "Mozilla/5.0"
+
+# BeautifulSoup backend: the C-based lxml parser when installed, otherwise the stdlib one
+HTML_PARSER = "lxml" if find_spec("lxml") is not None else "html.parser"
+
+class RateLimitError(Exception):
+    """Raised on HTTP 429; retry_after holds the server's Retry-After delay in seconds, if given."""
+    def __init__(self, retry_after=None):
+        super().__init__("Rate limited")
+        self.retry_after = retry_after
+
+def parse_retry_after(response):
+    """Return the Retry-After header of response in seconds, or None if absent or not numeric."""
+    value = response.headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None  # HTTP-date form; fall back to exponential backoff
+
+def chunked(iterable, size):
+    """Yield successive lists of up to size items from any iterable."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def json_loads(data):
+    """Decode JSON from bytes or str, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps(data):
+    """Encode data as compact UTF-8 JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def save_data(data, output_path):
+    """Write data to output_path as indented UTF-8 JSON, creating parent directories as needed."""
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if orjson is not None:
+        payload = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    else:
+        payload = json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+    with open(output_path, "wb") as f:
+        f.write(payload)
+
+def save_jsonl(records, output_path=None):
+    """Write each record as one compact JSON line as soon as it is produced.
+
+    Writes to output_path when given, otherwise to stdout. Returns the number of records written.
+    """
+    if output_path is None:
+        return _write_lines(records, sys.stdout.buffer)
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output_path, "wb") as f:
+        return _write_lines(records, f)
+
+def _write_lines(records, stream):
+    count = 0
+    for record in records:
+        stream.write(json_dumps(record) + b"\n")
+        count += 1
+    stream.flush()
+    return count
+
+def make_request(url, payload, cookies=None, headers=None, max_retries=3, session=None, rate_limiter=None):
+    """Make HTTP request with retry logic, reusing session's pooled connections when given.
+
+    payload may be a dict or JSON bytes that were already encoded by the caller. When a
+    rate_limiter is given, every attempt (including retries) takes a token from it and
+    reports the server's rate-limit headers back to it.
+    """
+    http = session or DEFAULT_SESSION
+    # Encode once up front so retries resend the same bytes
+    body = payload if isinstance(payload, bytes) else json_dumps(payload)
+    request_headers = {**headers, **_JSON_HEADERS} if headers else _JSON_HEADERS
     retries = 0
     while retries < max_retries:
         try:
-            response = requests.post(url, json=payload, cookies=cookies, headers=headers, timeout=30)
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            response = http.post(url, data=body, cookies=cookies, headers=request_headers, timeout=30)
+            if rate_limiter is not None:
+                rate_limiter.update_from_headers(response.headers)
             if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 403:
+                return json_loads(response.content)
+            elif response.status_code in _AUTH_FAILURE_STATUSES:
                 raise Exception("Authentication failed: Invalid or expired cookies")
             elif response.status_code == 429:
-                raise Exception("Rate limited")
+                raise RateLimitError(parse_retry_after(response))
             else:
-                print(f"Error response: {response.text[:200]}...")
+                logger.warning("Error response: %s...", response.text[:200])
                 raise Exception(f"Request failed with status code: {response.status_code}")
         except requests.exceptions.RequestException as e:
             retries += 1
             if retries >= max_retries:
                 raise Exception(f"Request failed after {max_retries} retries: {str(e)}")
-            sleep_time = 2 ** retries
-            print(f"Request failed, retrying in {sleep_time} seconds...")
+            # Jitter spreads out workers that failed together so they don't retry in lockstep
+            sleep_time = 2 ** retries + random.uniform(0, 1.0)
+            logger.warning("Request failed, retrying in %.1f seconds...", sleep_time)
             time.sleep(sleep_time)
 
 def handle_rate_limit(request_func, max_retries=5):
-    """Handle rate limiting with exponential backoff."""
+    """Handle rate limiting, waiting as long as Retry-After says or backing off exponentially, plus jitter.
+
+    Makes up to max_retries attempts; if the last one is still rate limited, its error is raised.
+    """
     retries = 0
-    while retries < max_retries:
+    while True:
         try:
             return request_func()
         except Exception as e:
-            if "Rate limited" in str(e) and retries < max_retries:
+            if "Rate limited" in str(e):
                 retries += 1
-                sleep_time = 2 ** retries
-                print(f"Rate limited, retrying in {sleep_time} seconds... (Attempt {retries}/{max_retries})")
+                if retries >= max_retries:
+                    # Out of attempts: hand the rate limit error to the caller instead of returning None
+                    raise
+                retry_after = getattr(e, "retry_after", None)
+                sleep_time = retry_after if retry_after is not None else 2 ** retries
+                # Jitter keeps a batch of workers limited at once from all retrying at the same instant
+                sleep_time += random.uniform(0, 1.0)
+                logger.warning("Rate limited, retrying in %.1f seconds... (Attempt %s/%s)", sleep_time, retries, max_retries)
                 time.sleep(sleep_time)
             else:
                 raise e
 
+class TokenBucket:
+    """Thread-safe token bucket: allows bursts of up to `burst` requests, refilled at rate/per per second.
+
+    Callers only sleep once the bucket is empty, instead of pausing before every request.
+    """
+    def __init__(self, rate, per=1.0, burst=1):
+        self.fill_rate = rate / per
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, blocking until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.fill_rate)
+            self._updated = now
+            # Reserve the token even when the bucket is empty; the deficit is the caller's wait
+            self._tokens -= 1
+            delay = -self._tokens / self.fill_rate if self._tokens < 0 else 0
+        if delay > 0:
+            time.sleep(delay)
+
+    def update_from_headers(self, headers):
+        """Tighten the bucket to the server's RateLimit-Remaining/RateLimit-Reset headers, when sent.
+
+        Never loosens it: the server's view only lowers the tokens on hand, and an exhausted
+        quota holds further requests until its reset.
+        """
+        try:
+            remaining = int(headers["RateLimit-Remaining"])
+            reset = float(headers.get("RateLimit-Reset", 0))
+        except (KeyError, ValueError, TypeError):
+            return
+        with self._lock:
+            # With nothing left, the deficit makes the next caller wait out the reset window
+            limit = remaining if remaining > 0 else -reset * self.fill_rate
+            self._tokens = min(self._tokens, limit)
+
+def _collapse_blank(text):
+    """Reduce a whitespace-only string to one newline or space, the way bs4 stores it."""
+    if text and not text.strip(_ASCII_SPACES):
+        return '\n' if '\n' in text else ' '
+    return text
+
+def collapse_whitespace(text):
+    """Collapse blank-line runs to one empty line and space runs to a single space."""
+    return _RE_WHITESPACE.sub(lambda m: '\n\n' if m.group(1) else ' ', text)
+
 def parse_html_content(html_content):
     """Parse HTML content to extract plain text."""
     if not html_content:
         return ""
-    soup = BeautifulSoup(html_content, 'html.parser')
-    for code in soup.find_all('pre'):
-        code.extract()
-    text = soup.get_text()
-    text = re.sub(r'\n\s*\n', '\n\n', text)
-    text = re.sub(r' +', ' ', text)
-    return text.strip()
+    # Without markup or entities the parser would hand the text back unchanged
+    if '<' not in html_content and '&' not in html_content:
+        return collapse_whitespace(html_content).strip()
+    # Parsers are imported here so entrypoints that never parse HTML don't pay for them
+    if HTML_PARSER == "lxml":
+        # Straight lxml: tree building and text extraction both stay in C
+        from lxml import html
+        # Wrapping in a div keeps a bare <pre> from becoming the (undroppable) root
+        tree = html.fragment_fromstring(html_content, create_parent="div")
+        for code in list(tree.iter('pre')):
+            code.drop_tree() # Unlike remove(), keeps the text that follows the block
+        # Match the bs4 path, which keeps the whitespace between tags as one newline or space
+        for node in tree.iter():
+            node.text = _collapse_blank(node.text)
+            node.tail = _collapse_blank(node.tail)
+        text = tree.text_content()
+    else:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html_content, HTML_PARSER)
+        for code in soup.find_all('pre'):
+            code.decompose()
+        text = soup.get_text()
+    return collapse_whitespace(text).strip()
 
 def log_error(message, error=None):
     """Log error messages."""
     if error:
-        print(f"ERROR: {message} - {str(error)}")
+        logger.error("%s - %s", message, error)
     else:
-        print(f"ERROR: {message}")
\ No newline at end of file
+        logger.error("%s", message)
\ No newline at end of file
@@ -0,0 +1,137 @@
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import requests
+
+from src import fetcher as fetcher_module, utils
+from src.cache import DiskCache
+from src.fetcher import LeetCodeFetcher
+
+
+class FakeResponse:
+    def __init__(self, submissions=None, status_code=200):
+        self.status_code = status_code
+        self.headers = {}
+        self.content = json.dumps({"submissions_dump": submissions or []}).encode()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error")
+
+
+class FakeSession:
+    """Serves queued responses (or raises queued exceptions) for the submissions endpoint."""
+    def __init__(self):
+        self.queue = []
+
+    def get(self, url, timeout):
+        item = self.queue.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+
+def accepted(submission_id, lang, timestamp, code=None):
+    return {"id": submission_id, "lang": lang, "timestamp": str(timestamp), "status_display": "Accepted", "code": code}
+
+
+def by_language(submissions):
+    return {sub["language"]: (sub["submission_id"], sub["code"]) for sub in submissions}
+
+
+class SubmissionHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = DiskCache(self.cache_dir)
+        self.fetcher = LeetCodeFetcher("user", "session", "csrf", cache=self.cache)
+        self.session = FakeSession()
+        self.fetcher.session = self.session
+        self.requested_codes = []
+        self.codes_available = True
+
+        def fake_codes(fetcher, submission_ids):
+            self.requested_codes.extend(submission_ids)
+            if not self.codes_available:
+                return {}
+            return {submission_id: f"code-{submission_id}" for submission_id in submission_ids}
+
+        # LeetCodeFetcher uses __slots__, so fakes are patched onto the class
+        patches = [
+            mock.patch.object(LeetCodeFetcher, "fetch_submission_codes", fake_codes),
+            mock.patch.object(fetcher_module, "scrape_submission_code", lambda *args, **kwargs: None),
+            # Rate limit backoff would otherwise really sleep
+            mock.patch.object(utils.time, "sleep", lambda seconds: None),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def fetch(self, *responses):
+        self.session.queue.extend(responses)
+        return self.fetcher.fetch_submissions_for_question("two-sum")
+
+    def test_keeps_latest_accepted_per_language(self):
+        result = self.fetch(FakeResponse([
+            accepted(5, "python3", 500),
+            {"id": 4, "lang": "python3", "timestamp": "400", "status_display": "Wrong Answer"},
+            accepted(3, "cpp", 300, code="cpp-3"),
+            accepted(1, "python3", 100),
+        ]))
+        self.assertEqual(by_language(result), {"python3": ("5", "code-5"), "cpp": ("3", "cpp-3")})
+        self.assertEqual(self.requested_codes, [5])
+
+    def test_second_run_merges_new_winners_with_history(self):
+        self.fetch(FakeResponse([accepted(5, "python3", 500), accepted(3, "cpp", 300, code="cpp-3")]))
+        self.requested_codes.clear()
+
+        result = self.fetch(FakeResponse([
+            accepted(9, "python3", 900),
+            accepted(5, "python3", 500),
+            accepted(3, "cpp", 300, code="cpp-3"),
+        ]))
+        self.assertEqual(by_language(result), {"python3": ("9", "code-9"), "cpp": ("3", "cpp-3")})
+        # Nothing at or below the previous run's newest timestamp is reprocessed
+        self.assertEqual(self.requested_codes, [9])
+        self.assertEqual(self.cache.get("submissions:user:two-sum")["latest_ts"], 900)
+
+    def test_cutoff_ignores_submissions_already_seen(self):
+        self.fetch(FakeResponse([accepted(5, "python3", 500)]))
+
+        # An older accepted submission in another language is behind the cut-off and stays out
+        result = self.fetch(FakeResponse([accepted(5, "python3", 500), accepted(2, "java", 200)]))
+        self.assertEqual(by_language(result), {"python3": ("5", "code-5")})
+
+    def test_errors_fall_back_to_history(self):
+        self.fetch(FakeResponse([accepted(5, "python3", 500)]))
+        expected = {"python3": ("5", "code-5")}
+
+        for failures in (
+            [FakeResponse(status_code=403)],
+            [FakeResponse(status_code=500)],
+            [FakeResponse(status_code=429)] * 5,
+            [requests.exceptions.ConnectionError("reset")],
+        ):
+            with self.subTest(failure=failures[0]):
+                self.assertEqual(by_language(self.fetch(*failures)), expected)
+                self.assertEqual(self.session.queue, [])
+
+    def test_missing_code_is_retried_on_a_later_run(self):
+        self.codes_available = False
+        first = self.fetch(FakeResponse([accepted(5, "python3", 500)]))
+        self.assertEqual(first[0]["code"], fetcher_module._MISSING_CODE)
+
+        self.codes_available = True
+        second = self.fetch(FakeResponse([accepted(5, "python3", 500)]))
+        self.assertEqual(by_language(second), {"python3": ("5", "code-5")})
+        self.assertEqual(self.cache.get("code:5"), "code-5")
+
+
+if __name__ == "__main__":
+    unittest.main()